@@ -1,10 +1,19 @@
 import hid
+import ctypes
+import os
+import queue
+import struct
+import sys
+import threading
 import time
 
 # configuration 
-TARGET_VENDOR_ID = 0x06a31  # choose the correct usb device 
+TARGET_VENDOR_ID = 0x06a3  # choose the correct usb device 
 TARGET_PRODUCT_ID = 0xff32 
-POLL_DELAY = 0.001  # use a smaller delay for smoother tracking and to save cpu
+READ_TIMEOUT_MS = 5  # bounds how long the reader blocks, so it can notice shutdown
+DISPLAY_TIMEOUT = 0.1  # how long the display waits for a new frame before checking again
+REFRESH_INTERVAL = 1 / 60  # redraw at most 60 times a second, decoding still runs at full rate
+DISPLAY_FMT = b"%10d | %5d | %5d  \r"  # status line, carriage return redraws it in place
 
 # R660 wheel/pedal byte mapping
 # byte 0: Report ID. We only care about ID 0x07.
@@ -13,20 +22,24 @@ POLL_DELAY = 0.001  # use a smaller delay for smoother tracking and to save cpu
 # byte 4: Brake    (absolute, 8-bit, 255=off, 0=full)
 # byte 5: ignore
 # byte 6: buttons on wheel (ignore for now)
-STEER_BYTE_INDEX = 1
-REPORT_ID_BYTE_INDEX = 0
-GAS_BYTE_INDEX = 3
-BRAKE_BYTE_INDEX = 4
+FRAME_SIZE = 8  # frames are padded to 8 bytes so batch columns line up
+MIN_REPORT_SIZE = 5  # a usable report reaches at least the brake byte
+# unpacks (report id, steering, gas, brake) in one go, skipping byte 2
+REPORT_STRUCT = struct.Struct('<BBxBB')
 
 # full range 0 - 4090
 STEER_MIN = -2045
 STEER_MAX = 2045
 
+# gas and brake are inverted (255=off, 0=full), INVERT[x] flips a raw pedal byte
+INVERT = bytes(255 - i for i in range(256))
+
 ##TODO 
 # deadzone in the middle ~-2030 - 2050
 ##TODO also in the brake we have a weird problem with pedals
 
 # device listing to see all HID devices connected
+# returns the paths of the ones matching our VID/PID, so we don't enumerate twice
 def list_devices():
     devices = hid.enumerate()
     print(f"{'VID':<8} {'PID':<8} {'Product Name'}")
@@ -37,24 +50,210 @@ def list_devices():
         name = d.get('product_string', 'Unknown')
         print(f"0x{vid:04x}  0x{pid:04x}  {name}")
     print("-" * 50)
+    return [d['path'] for d in devices
+            if d.get('vendor_id') == TARGET_VENDOR_ID and d.get('product_id') == TARGET_PRODUCT_ID]
+
+# scheduling hints
+def raise_priority():
+    """
+    Asks the OS for steadier wakeups in the calling thread: SCHED_FIFO (or a
+    lower nice value) on Linux/macOS, a 1 ms timer period and high priority
+    class on Windows. Best effort, without the rights for it nothing changes.
+    Returns True if timeBeginPeriod(1) is active and needs timeEndPeriod(1).
+    """
+    if sys.platform == 'win32':
+        HIGH_PRIORITY_CLASS = 0x80
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), HIGH_PRIORITY_CLASS)
+        # returns TIMERR_NOERROR (0) on success
+        return ctypes.windll.winmm.timeBeginPeriod(1) == 0
+    try:
+        # needs root or CAP_SYS_NICE
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(1))
+    except (AttributeError, OSError):
+        try:
+            os.nice(-10)
+        except OSError:
+            pass
+    return False
+
+# background reader
+def read_frames(device, frames, errors, stop):
+    """
+    Runs in a daemon thread. Blocks inside hidapi until the next report
+    lands (or READ_TIMEOUT_MS passes) and hands every frame to the main
+    thread through 'frames'. Exits once 'stop' is set.
+    """
+    _read = device.read
+    _put = frames.put
+    _stopped = stop.is_set
+    # usb wakeup latency is mostly scheduling jitter, so boost this thread
+    timer_raised = raise_priority()
+    try:
+        while not _stopped():
+            data = _read(FRAME_SIZE, timeout_ms=READ_TIMEOUT_MS)
+            # The device sends multiple report types. The one with ID 0x07
+            # contains the axis data we care about. Ignore all others,
+            # because they are 'TRASH', the main thread never sees them
+            if len(data) >= MIN_REPORT_SIZE and data[0] == 0x07:
+                # hidapi hands back a list of ints, struct wants a buffer.
+                # shorter reports get padded, otherwise they would shift every column of the batch
+                _put(bytes(data).ljust(FRAME_SIZE, b'\0'))
+    except IOError as e:
+        # the main thread owns the error reporting
+        errors.put(e)
+    finally:
+        if timer_raised:
+            ctypes.windll.winmm.timeEndPeriod(1)
+
+# frame decoder
+def decode_frames(batch, last_steer_raw, steer_position):
+    """
+    Turns a non-empty batch of raw 8-byte axis reports (ID 0x07) into
+    steering, gas and brake values. Steering is carried across batches
+    through 'last_steer_raw' and 'steer_position'.
+    Returns (last_steer_raw, steer_position, gas, brake).
+    """
+    # locals instead of module globals inside the per-frame loop
+    _smin = STEER_MIN
+    _smax = STEER_MAX
+
+    # glue the batch together and slice out whole columns at C speed,
+    # instead of unpacking every frame on its own
+    buf = b''.join(batch)
+
+    for current_steer_raw in buf[1::FRAME_SIZE]:
+        # steering reconstruction
+        # every frame counts here, otherwise we would lose encoder ticks.
+        # the clamp has to run per frame, a clamp on the summed deltas would
+        # not match once the wheel hits a limit and turns back
+        if last_steer_raw is not None:
+            # calculate delta(change), handling the 8-bit wrap-around.
+            # the difference is taken as a signed byte, same as an int8 cast in C,
+            # so a wrap-around in either direction comes out right without branches
+            delta = ((current_steer_raw - last_steer_raw + 128) & 0xFF) - 128
+
+            # accumulate the delta to get the absolute position
+            steer_position += delta
+            # clamp the position to the known limits of the device
+            # plain compares, the limits are almost never hit while driving
+            if steer_position < _smin:
+                steer_position = _smin
+            elif steer_position > _smax:
+                steer_position = _smax
+        last_steer_raw = current_steer_raw
+
+    # only the newest pedal reading matters for the display
+    _, _, gas_raw, brake_raw = REPORT_STRUCT.unpack_from(buf, len(buf) - FRAME_SIZE)
+
+    # pedal processing
+    # gas and brake are inverted (255=off, 0=full), so we flip it.
+    gas_value = INVERT[gas_raw]
+    brake_value = INVERT[brake_raw]
+
+    return last_steer_raw, steer_position, gas_value, brake_value
+
+# optional native decoder (decode.c), used when the shared library was built:
+#   gcc -O3 -shared -fPIC -o decode.so decode.c      (linux/macos)
+#   gcc -O3 -shared -o decode.dll decode.c           (windows, mingw)
+# without it, or if it was built from a different decode.c, everything runs
+# through decode_frames above
+NATIVE_ABI_VERSION = 1  # must match DECODE_ABI_VERSION in decode.c
+
+class DecodeState(ctypes.Structure):
+    _fields_ = [
+        ('last_raw', ctypes.c_int32),
+        ('pos', ctypes.c_int32),
+        ('min', ctypes.c_int32),
+        ('max', ctypes.c_int32),
+    ]
+
+def load_native_decoder():
+    """
+    Loads decode.so / decode.dll from next to this script.
+    Returns the 'accumulate' function, or None if there is no library or
+    it was built from a decode.c with another NATIVE_ABI_VERSION.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('decode.so', 'decode.dll'):
+        try:
+            lib = ctypes.CDLL(os.path.join(here, name))
+        except OSError:
+            continue
+        # builds from before the version check have no decode_abi_version at all
+        try:
+            abi_version = lib.decode_abi_version
+        except AttributeError:
+            continue
+        abi_version.argtypes = []
+        abi_version.restype = ctypes.c_int32
+        if abi_version() != NATIVE_ABI_VERSION:
+            continue
+        accumulate = lib.accumulate
+        accumulate.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.POINTER(DecodeState)]
+        accumulate.restype = ctypes.c_int32
+        return accumulate
+    return None
+
+NATIVE_ACCUMULATE = load_native_decoder()
+# the ctypes call costs more than a few frames of python, small batches stay in python
+NATIVE_MIN_BATCH = 8
+# one state struct reused for every call, so nothing is allocated per batch
+_native_state = DecodeState(-1, 0, STEER_MIN, STEER_MAX)
+_native_state_ref = ctypes.byref(_native_state)
+
+def decode_frames_native(batch, last_steer_raw, steer_position):
+    """
+    Same contract as decode_frames, but the steering loop runs in C
+    for batches of NATIVE_MIN_BATCH frames or more.
+    """
+    if len(batch) < NATIVE_MIN_BATCH:
+        return decode_frames(batch, last_steer_raw, steer_position)
+
+    buf = b''.join(batch)
+    state = _native_state
+    state.last_raw = -1 if last_steer_raw is None else last_steer_raw
+    state.pos = steer_position
+    NATIVE_ACCUMULATE(buf, len(batch), _native_state_ref)
+
+    # pedal processing, see decode_frames
+    _, _, gas_raw, brake_raw = REPORT_STRUCT.unpack_from(buf, len(buf) - FRAME_SIZE)
+    return state.last_raw, state.pos, INVERT[gas_raw], INVERT[brake_raw]
 
 # data intepreter
-def sniff_data():
+def sniff_data(path=None):
     """
     Connects to the R660 wheel, reads its HID data, and interprets it into
-    meaningful steering, gas, and brake values.
+    meaningful steering, gas, and brake values. Opens 'path' (as returned
+    by list_devices) if given, otherwise looks the device up by VID/PID.
     """
     device = None
+    reader = None
+    stop = threading.Event()
     try:
-        # conneccts to our device using VIP/DIP
-        # non-block to avoid freezing, send data or return nothing and continue
+        # conneccts to our device by path, or using VIP/DIP if we don't have one
+        # blocking mode, the reader thread sleeps in hidapi until a report arrives
         device = hid.device()
-        device.open(TARGET_VENDOR_ID, TARGET_PRODUCT_ID)
-        device.set_nonblocking(1)
+        if path is not None:
+            device.open_path(path)
+        else:
+            device.open(TARGET_VENDOR_ID, TARGET_PRODUCT_ID)
+        device.set_nonblocking(0)
+
+        # usb latency lives in the reader thread, decoding/printing stays here
+        frames = queue.Queue()
+        errors = queue.Queue()
+        reader = threading.Thread(target=read_frames, args=(device, frames, errors, stop), daemon=True)
+        reader.start()
 
         print("Connected. Reading wheel and pedal data... (Ctrl+C to stop)")
         print(f"\n{'Steering':>10} | {'Gas':>5} | {'Brake':>5}")
         print("-" * 32)
+        # the status line goes straight to the byte buffer below the text layer,
+        # so push the header out first to keep the order on screen
+        sys.stdout.flush()
+        _write = sys.stdout.buffer.write
+        _flush = sys.stdout.buffer.flush
 
         # state variables for steering reconstruction
         # +because steering is relative encoder (wraps) we need to know
@@ -62,46 +261,63 @@ def sniff_data():
         last_steer_raw = None
         steer_position = 0
 
+        # locals for everything the loop touches on every pass
+        _get = frames.get
+        _get_nowait = frames.get_nowait
+        _monotonic = time.monotonic
+        _decode = decode_frames_native if NATIVE_ACCUMULATE else decode_frames
+        _empty = queue.Empty
+        _refresh = REFRESH_INTERVAL
+        _timeout = DISPLAY_TIMEOUT
+        _fmt = DISPLAY_FMT
+
+        # display state, 'shown' tells if the newest values already made it to the screen
+        shown = True
+        last_print = 0.0
+
         while True:
-            # read a data packet (8 bytes)
-            data = device.read(8)
-            if not data:
-                time.sleep(POLL_DELAY)
-                continue
+            # wait for the next data packet (8 bytes) from the reader thread.
+            # with a skipped redraw pending, wait only until its refresh slot,
+            # so the wheel's resting position shows up without delay
+            if shown:
+                wait = _timeout
+            else:
+                wait = max(0.0, last_print + _refresh - _monotonic())
+            try:
+                batch = [_get(timeout=wait)]
+            except _empty:
+                if not errors.empty():
+                    raise errors.get()
+                batch = []
 
-            # The device sends multiple report types. The one with ID 0x07
-            # contains the axis data we care about. Ignore all others,
-            # because they are 'TRASH'
-            if data[REPORT_ID_BYTE_INDEX] != 0x07:
-                time.sleep(POLL_DELAY)
+            # drain everything that piled up while we were busy printing,
+            # so the display always shows the newest frame instead of lagging
+            while True:
+                try:
+                    batch.append(_get_nowait())
+                except _empty:
+                    break
+
+            if batch:
+                last_steer_raw, steer_position, gas_value, brake_value = _decode(
+                    batch, last_steer_raw, steer_position)
+                shown = False
+
+            if shown:
                 continue
 
-            # steering reconstruction
-            current_steer_raw = data[STEER_BYTE_INDEX]
-            if last_steer_raw is not None:
-                # calculate delta(change), handling the 8-bit wrap-around.
-                # if the jump is > 127 (half of 255), it's a wrap-around in one direction.
-                # if the jump is < -127, it's a wrap-around in the other.
-                delta = current_steer_raw - last_steer_raw
-                if delta > 127:
-                    delta -= 256
-                elif delta < -127:
-                    delta += 256
-
-                # accumulate the delta to get the absolute position
-                steer_position += delta
-                # clamp the position to the known limits of the device
-                steer_position = max(STEER_MIN, min(STEER_MAX, steer_position))
-            last_steer_raw = current_steer_raw
-
-            # pedal processing
-            # gas and brake are inverted (255=off, 0=full), so we flip it.
-            gas_value = 255 - data[GAS_BYTE_INDEX]
-            brake_value = 255 - data[BRAKE_BYTE_INDEX]
+            # terminal output is the slow part, so cap it at REFRESH_INTERVAL.
+            # an empty batch means the wait above ran into the refresh slot, so draw now
+            now = _monotonic()
+            if batch and now - last_print < _refresh:
+                continue
 
             # output display
             # use carriage return to update the line in-place instead of printing shit-ton
-            print(f"{steer_position:10} | {gas_value:5} | {brake_value:5}  ", end='\r')
+            _write(_fmt % (steer_position, gas_value, brake_value))
+            _flush()
+            last_print = now
+            shown = True
 
     except KeyboardInterrupt:
         print("\nStopped.")
@@ -109,10 +325,15 @@ def sniff_data():
         print("\nError: Device not found or could not be read.")
         print(f"Ensure a device with VID=0x{TARGET_VENDOR_ID:04x} and PID=0x{TARGET_PRODUCT_ID:04x} is connected.")
     finally:
+        # let the reader leave hid_read before the handle goes away
+        stop.set()
+        if reader:
+            reader.join()
         if device:
             device.close()
 
 # main  
 if __name__ == "__main__":
-    list_devices()
-    sniff_data()
+    paths = list_devices()
+    # with no match we still try VID/PID, which reports the usual error
+    sniff_data(paths[0] if paths else None)
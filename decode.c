@@ -0,0 +1,52 @@
+/*
+ * native steering accumulator for ESP32.py, loaded through ctypes if present.
+ * build (linux/macos):     gcc -O3 -shared -fPIC -o decode.so decode.c
+ * build (windows, mingw):  gcc -O3 -shared -o decode.dll decode.c
+ * must stay in sync with decode_frames() in ESP32.py, bump DECODE_ABI_VERSION
+ * here and NATIVE_ABI_VERSION there whenever the decoding rules or State change
+ */
+#include <stddef.h>
+#include <stdint.h>
+
+#define DECODE_ABI_VERSION 1
+#define FRAME_SIZE 8
+#define STEER_BYTE 1
+
+typedef struct {
+    int32_t last_raw;  /* previous raw steering byte, -1 before the first frame */
+    int32_t pos;       /* accumulated steering position */
+    int32_t min;       /* clamp limits, filled in from STEER_MIN/STEER_MAX */
+    int32_t max;
+} State;
+
+/* lets the loader reject a library built from an older decode.c */
+int32_t decode_abi_version(void)
+{
+    return DECODE_ABI_VERSION;
+}
+
+/* walks n_frames axis reports in buf and updates the steering state in place */
+int32_t accumulate(const uint8_t *buf, size_t n_frames, State *s)
+{
+    int32_t last = s->last_raw;
+    int32_t pos = s->pos;
+
+    for (size_t i = 0; i < n_frames; i++) {
+        int32_t cur = buf[i * FRAME_SIZE + STEER_BYTE];
+        if (last >= 0) {
+            /* 8-bit wrap-around, the signed byte difference is the delta */
+            int32_t delta = (int8_t)(cur - last);
+
+            pos += delta;
+            if (pos < s->min)
+                pos = s->min;
+            else if (pos > s->max)
+                pos = s->max;
+        }
+        last = cur;
+    }
+
+    s->last_raw = last;
+    s->pos = pos;
+    return pos;
+}